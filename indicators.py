@@ -0,0 +1,52 @@
+"""Compiled indicator kernels for the stock agent app."""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # Pure-Python fallback so the app still runs without numba installed
+    def njit(*args, **kwargs):
+        def wrap(func):
+            return func
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return wrap
+
+# Eager signatures: compile at import (Streamlit boot) rather than on first click
+@njit(['Tuple((f4[:],f4[:]))(f4[:],i8,i8)',
+       'Tuple((f8[:],f8[:]))(f8[:],i8,i8)'], cache=True, fastmath=True)
+def sma_rsi(close, win_sma=20, win_rsi=14):
+    """One pass over the close array producing (SMA, Wilder RSI)."""
+    n = close.shape[0]
+    sma = np.full(n, np.nan, close.dtype)
+    rsi = np.full(n, np.nan, close.dtype)
+    run_sum = 0.0
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(n):
+        run_sum += close[i]
+        if i >= win_sma:
+            run_sum -= close[i - win_sma]
+        if i >= win_sma - 1:
+            sma[i] = run_sum / win_sma
+        if i == 0:
+            continue
+        d = close[i] - close[i - 1]
+        gain = d if d > 0 else 0.0
+        loss = -d if d < 0 else 0.0
+        if i <= win_rsi:
+            # Seed Wilder's averages from the first win_rsi moves
+            avg_gain += gain
+            avg_loss += loss
+            if i == win_rsi:
+                avg_gain /= win_rsi
+                avg_loss /= win_rsi
+        else:
+            avg_gain = (avg_gain * (win_rsi - 1) + gain) / win_rsi
+            avg_loss = (avg_loss * (win_rsi - 1) + loss) / win_rsi
+        if i >= win_rsi:
+            if avg_loss > 0:
+                rsi[i] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+            else:
+                rsi[i] = 100.0
+    return sma, rsi